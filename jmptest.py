@@ -4,4 +4,4 @@ rval, rmessage, df = jmptools.readjmp("TestFile.jmp")
 print df
 print rval, rmessage
 # write to csv if you want 
-#jmptools.to_csv("TestFile.csv")
\ No newline at end of file
+#jmptools.to_csv("TestFile.csv", df)
\ No newline at end of file
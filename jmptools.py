@@ -25,8 +25,13 @@
 import numpy as np
 import pandas as pd
 import struct
-import datetime
-import math
+import binascii
+import collections
+import mmap
+import threading
+import weakref
+import multiprocessing
+from multiprocessing.pool import ThreadPool
 
 import os
 
@@ -35,37 +40,56 @@ pd.set_option('expand_frame_repr', False)
 
 # module global variables
 version = 1.0  # reader version
-_data = None  # pandas dataframe that will hold all the JMP file data for module internal use (no JMP formatting info)
-_abs_column_addresses = []  # Every JMP file holds an absolute file offset for where each set of column info is held
-_jmpfile = None   # file object for the JMP file for reading
+_data_ref = None  # weak reference to the pandas dataframe readjmp returned last, so to_csv can find it
+_jmpfile = None   # read-only memory map of the JMP file for reading
+_cursor = threading.local()  # _cursor.pos = current read position in _jmpfile, per thread so columns decode in parallel
 _n_rows = 0  # number of rows in the JMP data table
 _n_columns = 0  # number of columns in the JMP data table
 
 # column_format_type splits into these 4 categories for date/time, time only, date only, duration formatting
 # Internally in the JMP file, the data for such a column will be stored as a double.  But information below
 # is used to figure out from the formatting how I should extract the value.
-_column_format_type_dt_vals = [0x69, 0x6A, 0x73, 0x74, 0x7D, 0x7E, 0x77, 0x78, 0x86, 0x87, 0x7B, 0x7C,
-                               0x80, 0x81, 0x89, 0x8A]
-_column_format_type_t_vals = [0x79, 0x82]
-_column_format_type_d_vals = [0x65, 0x6E, 0x6F, 0x8B, 0x70, 0x71, 0x72, 0x7A, 0x75, 0x76, 0x7F, 0x66, 0x67, 0x88]
-_column_format_type_dur_vals = [0x6C, 0x6D, 0x83, 0x84, 0x85]
+# Kept as frozensets so checking a column_format_type against them is a single hash lookup.
+_column_format_type_dt_vals = frozenset([0x69, 0x6A, 0x73, 0x74, 0x7D, 0x7E, 0x77, 0x78, 0x86, 0x87, 0x7B, 0x7C,
+                                         0x80, 0x81, 0x89, 0x8A])
+_column_format_type_t_vals = frozenset([0x79, 0x82])
+_column_format_type_d_vals = frozenset([0x65, 0x6E, 0x6F, 0x8B, 0x70, 0x71, 0x72, 0x7A, 0x75, 0x76, 0x7F, 0x66,
+                                        0x67, 0x88])
+_column_format_type_dur_vals = frozenset([0x6C, 0x6D, 0x83, 0x84, 0x85])
+# date/time of some type (i.e. anything but a duration), and then all 4 categories together
+_column_format_type_dtd_vals = _column_format_type_dt_vals | _column_format_type_t_vals | _column_format_type_d_vals
+_column_format_type_all_vals = _column_format_type_dtd_vals | _column_format_type_dur_vals
 _column_format_type_bucket = {"datetime": 0, "time": 1, "date": 2, "duration": 3}
 
+# column field types that _decode_column doesn't need - each is a 4-byte length followed by that many bytes,
+# so all of them get read past the same way
+# 0x01 = related to notes
+# 0x05 = range check, stored as 2 doubles (lower, upper of range), followed by 2 bytes indicating range check rule
+# 0x06 = has to do with column hidden/exclude state
+# 0x07 = formula field
+# 0x08 = related to list check - enumerates possible values in terms of byte value
+# 0x10 = related to a row-state column
+# 0x09, 0x0B, 0x0C, 0x13 = haven't delved into these
+_column_field_skip_vals = frozenset([0x01, 0x05, 0x06, 0x07, 0x08, 0x09, 0x0B, 0x0C, 0x10, 0x13])
+
+# JMP date/time values count seconds from this epoch, 1/1/1904 12:00:00 AM
+_JMP_EPOCH_NS = np.datetime64('1904-01-01T00:00:00', 'ns')
+_NAT_NANOS = np.iinfo(np.int64).min  # NaT as an int64 count of nanoseconds
+
+# precompiled little-endian formats for the fixed size fields in the JMP file
+_U8 = struct.Struct('<B')
+_U16 = struct.Struct('<H')
+_U32 = struct.Struct('<I')
+_F64 = struct.Struct('<d')
+
 
 # for debug work:
 # take a byte array as input and give formatted hex string as output
 # num_per_line is further formatting for output
 def _bytetohex(bytearray_in, num_per_line=16):
-    byte_array_length = len(bytearray_in)
-    s = ""
-    for idx, x in enumerate(bytearray_in):
-        if (idx % num_per_line == 0) & (idx != 0):
-            s += '\r\n'
-        if idx == byte_array_length - 1:
-            s += '{:02X}'.format(x)
-        else:
-            s += '{:02X} '.format(x)
-    return s
+    h = binascii.hexlify(bytearray_in).upper()  # hex conversion done in C, 2 characters per byte
+    pairs = [h[i:i + 2] for i in range(0, len(h), 2)]
+    return ' \r\n'.join(' '.join(pairs[i:i + num_per_line]) for i in range(0, len(pairs), num_per_line))
 
 # for debug work:
 # take a list of byte arrays, and output a string of bytes
@@ -81,56 +105,83 @@ def _list_of_byte_array_to_hex(list_of_byte_array):
 
 # ***main routine to call***
 # pass a JMP filename/path this this function
-# return an error code, an error message, and copy of the _data (if no error) as a pandas dataframe
+# return an error code, an error message, and the JMP file data (if no error) as a pandas dataframe
+# (no JMP formatting info).  The dataframe is the caller's own, the module only keeps a weak reference to it
 def readjmp(filename):
     global _jmpfile
-    global _data
-    global _abs_column_addresses
-    _data = None
-    _abs_column_addresses = []
+    global _data_ref
+    _data_ref = None
 
-    _jmpfile = open(filename, "rb")
+    _cursor.pos = 0
     try:
-        _read_header()
+        # map the whole file into memory, every read below is then just a slice of the map
+        with open(filename, "rb") as jmpfile:
+            _jmpfile = mmap.mmap(jmpfile.fileno(), 0, access=mmap.ACCESS_READ)
+        abs_column_addresses = _read_header()
     except ValueError, e:
+        _jmpfile = None
         return -1, e.message, None
     try:
-        _decode_all_columns()
+        data = _decode_all_columns(abs_column_addresses)
     except ValueError, e:
+        _jmpfile = None
         return -2, e.message, None
 
-    _jmpfile.close()
-    return 0, "No error", _data.copy(deep=True)
+    # decoded columns can still be numpy views into the map, so drop our reference instead of closing it
+    # the file gets unmapped once nothing points into it anymore
+    _jmpfile = None
+    _data_ref = weakref.ref(data)
+    return 0, "No error", data
 
 
 # helper function: read n_bytes worth of data from the JMP file
 def _read_bytes(n_bytes):
-    global _jmpfile
-    return bytes(_jmpfile.read(n_bytes))
+    _cursor.pos += n_bytes
+    return _jmpfile[_cursor.pos - n_bytes:_cursor.pos]
+
+
+# helper function: move past n_bytes of the JMP file without reading them (for data that isn't needed)
+def _skip(n_bytes):
+    _cursor.pos += n_bytes
+
+
+# helper function: unpack the next value from the JMP file with one of the precompiled formats above
+def _unpack(fmt):
+    value = fmt.unpack_from(_jmpfile, _cursor.pos)[0]
+    _cursor.pos += fmt.size
+    return value
+
+
+# helper function: view the next count values of the given numpy dtype in the JMP file as an array
+# no copy is made, the array reads straight out of the memory map
+def _read_array(dtype, count):
+    values = np.frombuffer(_jmpfile, dtype=dtype, count=count, offset=_cursor.pos)
+    _cursor.pos += values.nbytes
+    return values
 
 
 # read the JMP header - this is the part before you get to the column definitions that contain the actual data
 # It has a lot of interesting stuff in it (scripts, row state, etc.), but I just read over that to get to the data.
+# Every JMP file holds an absolute file offset for where each set of column info is held, return those as a list
 def _read_header():
     global _n_rows
     global _n_columns
-    global _abs_column_addresses
     temp_data = _read_bytes(8)  # first 8 bytes should be FF FF 00 00 03 00 00 00 for JMP 11 _jmpfile
     if temp_data != bytearray.fromhex("FF FF 00 00 03 00 00 00"):
         raise ValueError('Error while reading header - _jmpfile is most likely not a JMP 11 version _jmpfile')
-    _n_rows = struct.unpack("I", _read_bytes(4))[0]  # next 4 bytes are # of rows
-    _n_columns = struct.unpack("I", _read_bytes(4))[0]  # next 4 bytes are # of columns
-    _read_bytes(12)  # unknown what these bytes are
-    _read_bytes(2)  # should be 06 00 (encoding type)
-    n_bytes_to_read = struct.unpack("I", _read_bytes(4))[0]
-    _read_bytes(n_bytes_to_read)  # 'utf-8' string in my example files
-    _read_bytes(2)  # should be 07 00 always?
-    n_bytes_to_read = struct.unpack("I", _read_bytes(4))[0]
-    _read_bytes(n_bytes_to_read)  # likely _jmpfile time stamp
+    _n_rows = _unpack(_U32)  # next 4 bytes are # of rows
+    _n_columns = _unpack(_U32)  # next 4 bytes are # of columns
+    _skip(12)  # unknown what these bytes are
+    _skip(2)  # should be 06 00 (encoding type)
+    n_bytes_to_read = _unpack(_U32)
+    _skip(n_bytes_to_read)  # 'utf-8' string in my example files
+    _skip(2)  # should be 07 00 always?
+    n_bytes_to_read = _unpack(_U32)
+    _skip(n_bytes_to_read)  # likely _jmpfile time stamp
 
     # read through a large chunk of the remaining header and should arrive
     # where column structures start to be described
-    # temp_bytes info:
+    # temp_bytes_val info (2 bytes, written below as they appear in the file):
     # 04 00, 05 00, 0F 00 = unknown
     # 03 00 = all the scripts in the table
     # 02 00 = row state color information, most likely
@@ -139,55 +190,108 @@ def _read_header():
     # FF FF = when I read this, I am at the column info
     done = False
     while not done:
-        temp_bytes = _read_bytes(2)  # describe what type of information follows (see above list)
-        n_bytes_to_read = struct.unpack("I", _read_bytes(4))[0]  # number of bytes associated with this section
+        temp_bytes_val = _unpack(_U16)  # describe what type of information follows (see above list)
+        n_bytes_to_read = _unpack(_U32)  # number of bytes associated with this section
         # this is the temp_data associated with this section, but don't need to understand for now
-        _read_bytes(n_bytes_to_read)  # read and discard
-        if temp_bytes == bytearray.fromhex("FF FF"):
+        _skip(n_bytes_to_read)  # skip over it
+        if temp_bytes_val == 0xFFFF:
             done = True
 
-    _read_bytes(2)  # should tell # of bytes used to give absolute offsets of column info
-    count = 0
-    while count < _n_columns:
-        _abs_column_addresses.append(_read_bytes(4))  # may need to revisit on extremely large files - won't be 4 bytes?
-        count += 1
+    _skip(2)  # should tell # of bytes used to give absolute offsets of column info
+    # one 4-byte offset per column, read as a block and kept as plain ints
+    # may need to revisit on extremely large files - won't be 4 bytes?
+    return _read_array('<u4', _n_columns).tolist()
 
 
-# export _data (pandas dataframe) to CSV format
-# input = file_name...what to write to
-def to_csv(file_name):
-    global _data
-    _data.to_csv(file_name, index=False, encoding='utf_8_sig')
+# export JMP data (pandas dataframe) to CSV format
+# input = file_name...what to write to, df...the dataframe from readjmp to write
+# if df is left out, the dataframe readjmp returned last is written, as long as the caller still holds on to it
+def to_csv(file_name, df=None):
+    if df is None:
+        df = _data_ref() if _data_ref is not None else None
+    if df is None:
+        raise ValueError('No JMP data to write - pass in the dataframe returned by readjmp')
+    df.to_csv(file_name, index=False, encoding='utf_8_sig')
 
 
 # decode all columns
 # go through each column offset we figured out above, and then go and decode the data for every column
-# then concatenate it all together into a final dataframe (_data)
-def _decode_all_columns():
-    global _data
-    global _abs_column_addresses
-    df_all = []
-    for idx, i in enumerate(_abs_column_addresses):
-        pd_series = _decode_column(i)
-        df_all.append(pd.concat(pd_series, axis=1))
-
-    # construct a concatenated final pandas dataframe
-    _data = pd.concat(df_all, axis=1)
+# then build the final dataframe from all of them in one go and return it
+# every column sits at its own offset in the file, so they are decoded in parallel on a thread pool
+def _decode_all_columns(abs_column_addresses):
+    n_threads = min(multiprocessing.cpu_count(), len(abs_column_addresses))
+    if n_threads > 1:
+        pool = ThreadPool(n_threads)
+        try:
+            decoded_columns = pool.map(_decode_column, abs_column_addresses)  # results come back in file order
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        decoded_columns = [_decode_column(i) for i in abs_column_addresses]
+
+    columns = collections.OrderedDict()  # keeps the columns in file order
+    for column_name, pd_series in decoded_columns:
+        columns[column_name] = pd_series
+
+    # construct the final pandas dataframe once, rather than concatenating column by column
+    return pd.DataFrame(columns, copy=False)
+
+
+# read the rows of a list check column - each row is a 1-byte index into the list of possible values
+# list_values is that list as a numpy array, with the value to use for empty rows appended on the end
+def _read_list_check_rows(list_values):
+    list_indexes = _read_array('<u1', _n_rows)
+    # FF means the row is empty, so point those rows at the empty value on the end of list_values
+    return list_values[np.where(list_indexes == 0xFF, len(list_values) - 1, list_indexes)]
+
+
+# read the rows of a column that holds one fixed size value of the given numpy dtype per row
+# the column's bytes per row has to be that size, otherwise every value would be read at the wrong stride
+def _read_rows(dtype, n_data_bytes_per_row):
+    if np.dtype(dtype).itemsize != n_data_bytes_per_row:
+        raise ValueError('Unhandled column row width = %d bytes, expected %d' %
+                         (n_data_bytes_per_row, np.dtype(dtype).itemsize))
+    return _read_array(dtype, _n_rows)
+
+
+# read the rows of an integer column - JMP marks a blank entry with blank_value (the most negative value
+# but one for the integer size), so return a nullable pandas integer array with those rows masked out
+# the values are copied once into a contiguous native integer buffer, which the array then owns
+def _read_integer_rows(dtype, blank_value, n_data_bytes_per_row):
+    row_values = _read_rows(dtype, n_data_bytes_per_row)
+    return pd.arrays.IntegerArray(row_values.astype(row_values.dtype.newbyteorder('=')), row_values == blank_value)
+
+
+# JMP seconds -> int64 nanoseconds, rounded to microseconds like datetime.timedelta does
+# (a double can't hold nanoseconds that far from 1904), nan -> NaT
+# follows the same steps as datetime.timedelta(seconds=...) so the results match it exactly: split off the whole
+# seconds first (exact), scale only the fraction to microseconds, then round what is left half away from zero
+# - scaling the full value by 1e6 would already round it to the nearest 0.5 microsecond for dates near today
+def _doubles_to_nanos(double_values):
+    nan_mask = np.isnan(double_values)
+    # nan rows are zeroed so the casts to int64 are well defined, then set to NaT
+    double_values = np.where(nan_mask, 0.0, double_values)
+    seconds = np.trunc(double_values)
+    micros = (double_values - seconds) * 1e6
+    whole_micros = np.trunc(micros)
+    whole_micros += np.where(np.abs(micros - whole_micros) >= 0.5, np.sign(micros), 0.0)
+    nanos = seconds.astype(np.int64) * 1000000000 + whole_micros.astype(np.int64) * 1000
+    nanos[nan_mask] = _NAT_NANOS
+    return nanos
 
 
 # - JMP stores date/time as a double, which is # of seconds since 1/1/1904 12:00:00 AM
-# - have to handle blank entries specially - these show up as double value nan, which
-# - is not handled well in python datetime functions
-# - also handles duration
-def _double_to_datetime(column_type, double_value):
-    if math.isnan(double_value):  # special case where it's a nan
-        dt_value = float('nan')
-    # date/time of some type:
-    elif column_type in _column_format_type_t_vals + _column_format_type_d_vals + \
-            _column_format_type_dt_vals:
-        dt_value = datetime.datetime(1904, 1, 1, 0, 0, 0) + datetime.timedelta(seconds=double_value)
+# - blank entries show up as double value nan
+# - converts a whole column of those doubles at once, also handles duration
+# - returns a datetime64[ns] array (timedelta64[ns] for durations) with nan doubles as NaT, plus the
+# - formatting type (date, time, datetime, duration) for the column
+def _doubles_to_datetime64(column_type, double_values):
+    nanos = _doubles_to_nanos(double_values).view('timedelta64[ns]')  # NaT stays NaT through the epoch shift
+    if column_type in _column_format_type_dtd_vals:
+        dt_values = _JMP_EPOCH_NS + nanos
     else:  # it's a duration
-        dt_value = datetime.timedelta(seconds=double_value)
+        dt_values = nanos
 
     if column_type in _column_format_type_t_vals:
         return_type = _column_format_type_bucket["time"]
@@ -196,99 +300,77 @@ def _double_to_datetime(column_type, double_value):
     elif column_type in _column_format_type_dur_vals:
         return_type = _column_format_type_bucket["duration"]
     else:
-        return_type = _column_format_type_bucket["datetime"]  # full date/time formatting or NaN
+        return_type = _column_format_type_bucket["datetime"]
 
-    return dt_value, return_type  # return datetime/nan, and then what type (date, time, datetime, duration)
+    return dt_values, return_type
 
 
 # given the byte in file related to the column format, return if column is a date/time/duration column
 def _is_datetime_column(column_format):
-    if column_format in _column_format_type_dt_vals + _column_format_type_t_vals + \
-            _column_format_type_d_vals + _column_format_type_dur_vals:
+    if column_format in _column_format_type_all_vals:
         return True  # it is a datetime column
     else:
         return False  # it is not a datetime column
 
 
 # decode a single column
-# input is the file address that starts describing the column
+# input is the file address (integer offset) that starts describing the column
 def _decode_column(file_address):
-    global _jmpfile
-    int_offset = struct.unpack("I", file_address)[0]  # get _jmpfile position to seek as integer
-    _jmpfile.seek(int_offset)  # seek to start of column name, first byte is the length of the string
-    column_name_length = struct.unpack("B", _read_bytes(1))[0]  # length of column name
+    _cursor.pos = file_address  # seek to start of column name, first byte is the length of the string
+    column_name_length = _unpack(_U8)  # length of column name
     column_name = _read_bytes(column_name_length).decode("utf-8")  # actual column name
     if column_name_length < 32:
-        _read_bytes(31 - column_name_length)
+        _skip(31 - column_name_length)
 
     # data_type_dict = {1: "Numeric", 2: "Char", 3: "Row State", 4: "Large String?", 0xFF: "1-byte Integer",
     # 0xFE: "2-byte Integer", 0xFC: "4-byte Integer"}
-    data_type = struct.unpack("B", _read_bytes(1))[0]  # numeric, char, row state, etc.
+    data_type = _unpack(_U8)  # numeric, char, row state, etc.
 
     # modeling_type_dict = {0: "Continuous", 1: "Ordinal", 2: "Nominal"}
-    _read_bytes(1)  # modeling_type - read, but don't actually need to use
+    _skip(1)  # modeling_type - don't actually need to use
 
     # print column_name +" ["+data_type_dict[data_type]+", "+modeling_type_dict[modeling_type]+"]"
     # column_format_width:
-    _read_bytes(1)  # for display purposes in JMP...don't need
-    column_format_type = struct.unpack("B", _read_bytes(1))[0]
-    n_data_bytes_per_row = struct.unpack("H", _read_bytes(2))[0]  # each row value takes up this many bytes
+    _skip(1)  # for display purposes in JMP...don't need
+    column_format_type = _unpack(_U8)
+    n_data_bytes_per_row = _unpack(_U16)  # each row value takes up this many bytes
     # is_column_locked:
-    _read_bytes(2)  # I think this is 2 bytes, but not 100% sure
-    skip_number = struct.unpack("H", _read_bytes(2))[0]  # to help figure out how to skip to the actual row data
-    _read_bytes(12)
+    _skip(2)  # I think this is 2 bytes, but not 100% sure
+    skip_number = _unpack(_U16)  # to help figure out how to skip to the actual row data
+    _skip(12)
     done = False
     skip_count = 1
     list_check = []
     is_list_check = False
     while (not done) and (skip_count <= skip_number - 1):
         skip_count += 1
-        temp_bytes_val = struct.unpack("H", _read_bytes(2))[0]
-        # 0x06 has to do with column hidden/exclude state, others I haven't delved into
-        if (temp_bytes_val == 0x0C) or (temp_bytes_val == 0x0B) or (temp_bytes_val == 0x09) or \
-                (temp_bytes_val == 0x13) or (temp_bytes_val == 0x06):
-            field_length = struct.unpack("I", _read_bytes(4))[0]
-            _read_bytes(field_length)
-        # formula field, treat specially - basically read past it, but have to determine how much to read
-        elif temp_bytes_val == 0x07:
-            field_length = struct.unpack("I", _read_bytes(4))[0]
-            _read_bytes(field_length)
-        elif temp_bytes_val == 0x08:  # related to list check - enumerates possible values in terms of byte value
-            num_vals = struct.unpack("I", _read_bytes(4))[0]
-            _read_bytes(num_vals)  # finish reading past the field
-        # range check is stored as 2 doubles (lower, upper of range), followed by 2 bytes
-        # indicating range check rule
-        elif temp_bytes_val == 0x05:  # indicates there is a range check on this column
-            num_vals = struct.unpack("I", _read_bytes(4))[0]  # next 4 bytes indicate length of bytes to read
-            _read_bytes(num_vals)  # finish reading past the field, do nothing with it
-        elif temp_bytes_val == 0x10:  # related to a row-state column
-            num_vals = struct.unpack("I", _read_bytes(4))[0]  # next 4 bytes indicate length of bytes to read
-            _read_bytes(num_vals)  # finish reading past the field, do nothing with it
-        elif temp_bytes_val == 0x01:  # related to notes
-            num_vals = struct.unpack("I", _read_bytes(4))[0]  # next 4 bytes indicate length of bytes to read
-            _read_bytes(num_vals)  # finish reading past the field, do nothing with it
+        temp_bytes_val = _unpack(_U16)
+        # fields that are just read past (see _column_field_skip_vals)
+        if temp_bytes_val in _column_field_skip_vals:
+            field_length = _unpack(_U32)  # next 4 bytes indicate length of bytes to read
+            _skip(field_length)  # skip past the rest of the field, do nothing with it
         # specifically handle list check type attributes on columns
         elif temp_bytes_val == 0x04:  # List check field - lists out all options and then references them
             is_list_check = True
-            field_length = struct.unpack("I", _read_bytes(4))[0]
-            num_list_items = struct.unpack("H", _read_bytes(2))[0]
+            field_length = _unpack(_U32)
+            num_list_items = _unpack(_U16)
             record_length = (field_length - 2) / num_list_items
             if data_type == 1:  # numeric, each is stored as 8 bytes
                 for i in range(num_list_items):
-                    list_check.append(struct.unpack("d", _read_bytes(8))[0])
+                    list_check.append(_unpack(_F64))
             elif (data_type == 2) or (data_type == 4):  # char
                 for i in range(num_list_items):
                     if record_length - 1 < 256:  # this should normally be the case
-                        str_length = struct.unpack("B", _read_bytes(1))[0]
-                        list_check.append(_read_bytes(str_length))
-                        # read out any excess bytes that aren't part of the string
-                        _read_bytes(record_length - str_length - 1)
+                        str_length = _unpack(_U8)
+                        list_check.append(_read_bytes(str_length).decode("utf-8"))
+                        # skip any excess bytes that aren't part of the string
+                        _skip(record_length - str_length - 1)
                     else:  # there are strings >=256 bytes, JMP actually has a bug and does not handle this!
-                        _read_bytes(1)  # this string length is not correct - read & ignore
+                        _skip(1)  # this string length is not correct - ignore
                         list_check.append(_read_bytes(record_length - 1).partition('\x00')[0].decode("utf-8"))
         elif temp_bytes_val == 0x0F:  # given column name is actually >255 bytes, so get correct column long name
                                       # overwrite value read above
-            column_name_length = struct.unpack("I", _read_bytes(4))[0]
+            column_name_length = _unpack(_U32)
             column_name = _read_bytes(column_name_length).decode("utf-8")
         else:
             # didn't plan for this, raise an exception
@@ -299,85 +381,64 @@ def _decode_column(file_address):
     dt_formatting = None  # None means it's not date/time, which is the default
     if data_type == 1:  # numeric, actually I just assume it is stored as 8-byte double
         if not is_list_check:
-            for i in range(_n_rows):
-                # handle date/time, time, date columns
-                if _is_datetime_column(column_format_type):
-                    double_value = struct.unpack("d", _read_bytes(n_data_bytes_per_row))[0]
-                    dt_value, dt_formatting = _double_to_datetime(column_format_type, double_value)
-
-                    row_values.append(dt_value)
-                else:  # just treat as a number
-                    row_values.append(struct.unpack("d", _read_bytes(n_data_bytes_per_row))[0])
+            # the whole column is one contiguous block of doubles, so let numpy view it in one go
+            row_values = _read_rows('<f8', n_data_bytes_per_row)
+            # handle date/time, time, date columns
+            if _is_datetime_column(column_format_type):
+                row_values, dt_formatting = _doubles_to_datetime64(column_format_type, row_values)
         else:  # handle list check case
-            for i in range(_n_rows):
-                list_index = struct.unpack("B", _read_bytes(1))[0]
-                if list_index != 0xFF:  # FF means the row is empty
-                    if _is_datetime_column(column_format_type):  # handle datetime
-                        dt_value, dt_formatting = _double_to_datetime(column_format_type, list_check[list_index])
-                        row_values.append(dt_value)
-                    else:  # treat as number
-                        row_values.append(list_check[list_index])
-                else:
-                    row_values.append(float('nan'))
+            row_values = _read_list_check_rows(np.append(np.asarray(list_check, dtype='<f8'), np.nan))
+            if _is_datetime_column(column_format_type):  # handle datetime
+                row_values, dt_formatting = _doubles_to_datetime64(column_format_type, row_values)
     elif (data_type == 2) or (data_type == 4):  # chars
         if not is_list_check:
-            for i in range(_n_rows):
-                # different formatting of strings - lead byte gives length of string 0x0100 is max you can have
-                # here - 0xFF lead byte then 255 character string = 0x0100 field length
-                if n_data_bytes_per_row <= 0x0100:
-                    n_chars = struct.unpack("B", _read_bytes(1))[0]
-                    row_values.append(_read_bytes(n_chars).decode("utf-8"))
-                    # read excess characters that are in the buffer after the string, if present
-                    _read_bytes(n_data_bytes_per_row - n_chars - 1)
-                # takes long form where there is no byte before saying how long the string is, and instead string
-                # is null terminated and buffered bytes up to full length of field are there
-                else:
-                    # read and then get rid of the null terminated string and excess bytes
-                    row_values.append(_read_bytes(n_data_bytes_per_row).partition('\x00')[0].decode("utf-8"))
+            # different formatting of strings - lead byte gives length of string 0x0100 is max you can have
+            # here - 0xFF lead byte then 255 character string = 0x0100 field length
+            # every row is a fixed size record, so read the whole column in one go
+            if n_data_bytes_per_row <= 0x0100:
+                rows = _read_bytes(_n_rows * n_data_bytes_per_row)
+                # the lead byte of every record, read as one strided numpy view
+                row_n_chars = np.frombuffer(rows, dtype='<u1')[::n_data_bytes_per_row].tolist()
+                # only keep n_chars of each record, the excess characters after the string are just buffer
+                # (sliced from the raw bytes, so a string that really ends in null bytes keeps them)
+                row_values = [rows[row_start + 1:row_start + 1 + n_chars].decode("utf-8")
+                              for row_start, n_chars in zip(range(0, len(rows), n_data_bytes_per_row), row_n_chars)]
+            # takes long form where there is no byte before saying how long the string is, and instead string
+            # is null terminated and buffered bytes up to full length of field are there
+            else:
+                rows = _read_array('S%d' % n_data_bytes_per_row, _n_rows)
+                # get rid of the null terminated string and excess bytes
+                row_values = [chars.partition(b'\x00')[0].decode("utf-8") for chars in rows.tolist()]
         else:  # this is a list check column, so has bytes refering to item in list
-            for i in range(_n_rows):
-                list_index = struct.unpack("B", _read_bytes(1))[0]
-                if list_index != 0xFF:  # FF means the row is empty
-                    row_values.append(list_check[list_index].decode("utf-8"))
-                else:
-                    row_values.append("")
-    # row state column, should be 2 bytes per row, but don't check
+            row_values = _read_list_check_rows(np.array(list_check + [""], dtype=object))
+    # row state column, should be 2 bytes per row (_read_rows checks)
     # for this purpose, I will just decode to 2-byte integer - not sure what else to do at this point,
     # could ultimately break out as some sort of string saying what the state actually is
     elif data_type == 0x03:
-        for i in range(_n_rows):
-            row_values.append(struct.unpack("H", _read_bytes(n_data_bytes_per_row))[0])
+        # widened so arithmetic on it can go negative
+        row_values = _read_rows('<u2', n_data_bytes_per_row).astype(np.int64)
     # 1-byte signed integer, interestingly JMP does not use traditional range for 8-bit signed integer...
     # -126-127 is the range, with -127 representing "blank"
     elif data_type == 0xFF:
-        for i in range(_n_rows):
-            row_values.append(struct.unpack("b", _read_bytes(n_data_bytes_per_row))[0])
-            if row_values[i] == -127:
-                row_values[i] = ""
+        row_values = _read_integer_rows('<i1', -127, n_data_bytes_per_row)
     elif data_type == 0xFE:  # 2-byte signed integer,-32767 represents blank entry
-        for i in range(_n_rows):
-            row_values.append(struct.unpack("h", _read_bytes(n_data_bytes_per_row))[0])
-            if row_values[i] == -32767:
-                row_values[i] = ""
+        row_values = _read_integer_rows('<i2', -32767, n_data_bytes_per_row)
     elif data_type == 0xFC:  # 4-byte signed integer, -2147483647 represents blank entry
-        for i in range(_n_rows):
-            row_values.append(struct.unpack("i", _read_bytes(n_data_bytes_per_row))[0])
-            if row_values[i] == -2147483647:
-                row_values[i] = ""
+        row_values = _read_integer_rows('<i4', -2147483647, n_data_bytes_per_row)
 
     # create pandas series with appropriate dtype if a date/datetime/time/duration
     if dt_formatting == _column_format_type_bucket["time"]:
-        pd_series = [pd.Series(row_values, name=column_name, dtype=np.dtype('datetime64[ns]')).dt.time]
+        pd_series = pd.Series(row_values, name=column_name, dtype=np.dtype('datetime64[ns]')).dt.time
     elif dt_formatting == _column_format_type_bucket["date"]:
-        pd_series = [pd.Series(row_values, name=column_name, dtype=np.dtype('datetime64[ns]')).dt.date]
+        pd_series = pd.Series(row_values, name=column_name, dtype=np.dtype('datetime64[ns]')).dt.date
     elif dt_formatting == _column_format_type_bucket["duration"]:
-        pd_series = [pd.Series(row_values, name=column_name, dtype=np.dtype('timedelta64[ns]'))]
+        pd_series = pd.Series(row_values, name=column_name, dtype=np.dtype('timedelta64[ns]'))
     elif dt_formatting == _column_format_type_bucket["datetime"]:
-        pd_series = [pd.Series(row_values, name=column_name, dtype=np.dtype('datetime64[ns]'))]
+        pd_series = pd.Series(row_values, name=column_name, dtype=np.dtype('datetime64[ns]'))
     else:
-        pd_series = [pd.Series(row_values, name=column_name)]
+        pd_series = pd.Series(row_values, name=column_name)
 
-    return pd_series  # return the column as a pandas series
+    return column_name, pd_series  # return the column name and the column as a pandas series
 
 if __name__ == "__main__":
     '''